@@ -0,0 +1,152 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+import aiosqlite
+
+from db_writer import DBWriter, configure_connection
+
+# 1バッチで処理する行数
+BACKFILL_BATCH_SIZE = 500
+# バッチ間の待ち時間 (秒)。通常のリクエストに書き込みロックを譲るための間隔
+BACKFILL_THROTTLE = 0.2
+# 処理対象が無い場合に再確認するまでの間隔 (秒)
+BACKFILL_IDLE_INTERVAL = 60.0
+
+
+class Backfill:
+    """
+    派生データを既存の行に埋めるバックフィルの定義。
+
+    table は対象テーブル名 (進捗表示の最大id取得に使用)、
+    select_sql は「id > ? ORDER BY id LIMIT ?」を受け取り、先頭列がidの行を返すSELECT文、
+    compute はその行のリストから update_sql に渡すパラメータのリストを作る関数です。
+    compute はスレッドで実行されるため、イベントループをブロックしません。
+    """
+
+    def __init__(self, name: str, table: str, select_sql: str,
+                 compute: Callable[[List[tuple]], List[tuple]], update_sql: str):
+        self.name = name
+        self.table = table
+        self.select_sql = select_sql
+        self.compute = compute
+        self.update_sql = update_sql
+
+
+class BackfillRunner:
+    """
+    登録されたバックフィルをid順のバッチでバックグラウンド実行するランナー。
+
+    進捗は backfill_progress テーブルに最後に処理したidとして保存され、バッチの書き込みと
+    同じトランザクションで更新されるため、再起動しても途中から再開できます。
+    複数のワーカーが同時に動いた場合でも、進捗の条件付き更新に失敗した側のバッチは捨てられます。
+    """
+
+    def __init__(self, database_path: str, writer: DBWriter,
+                 batch_size: int = BACKFILL_BATCH_SIZE,
+                 throttle: float = BACKFILL_THROTTLE):
+        self.database_path = database_path
+        self.writer = writer
+        self.batch_size = batch_size
+        self.throttle = throttle
+        self._backfills: Dict[str, Backfill] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, backfill: Backfill):
+        self._backfills[backfill.name] = backfill
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def progress(self) -> List[dict]:
+        """
+        各バックフィルの進捗 (最後に処理したid, 対象テーブルの最大id, 完了フラグ) を返します。
+        """
+        result = []
+        async with aiosqlite.connect(self.database_path) as db:
+            cursor = await db.execute("SELECT name, last_id, done FROM backfill_progress")
+            rows = {row[0]: row for row in await cursor.fetchall()}
+            for name, backfill in self._backfills.items():
+                cursor = await db.execute(f"SELECT MAX(id) FROM {backfill.table}")
+                max_id = (await cursor.fetchone())[0] or 0
+                _, last_id, done = rows.get(name, (name, 0, 0))
+                result.append({
+                    "name": name,
+                    "last_id": last_id,
+                    "max_id": max_id,
+                    "done": bool(done),
+                })
+        return result
+
+    async def _init_progress(self):
+        for name in self._backfills:
+            await self.writer.execute(
+                "INSERT OR IGNORE INTO backfill_progress (name, last_id, done) VALUES (?, 0, 0)",
+                (name,)
+            )
+
+    async def _run(self):
+        # 進捗行を作れない場合 (マイグレーション未実行など) はログを出して再試行する
+        while True:
+            try:
+                await self._init_progress()
+                break
+            except Exception as e:
+                print(f"Failed to initialize backfill progress: {e}")
+                await asyncio.sleep(BACKFILL_IDLE_INTERVAL)
+        while True:
+            worked = False
+            for backfill in self._backfills.values():
+                try:
+                    worked = await self._run_batch(backfill) or worked
+                except Exception as e:
+                    print(f"Backfill {backfill.name} failed: {e}")
+                await asyncio.sleep(self.throttle)
+            if not worked:
+                await asyncio.sleep(BACKFILL_IDLE_INTERVAL)
+
+    async def _run_batch(self, backfill: Backfill) -> bool:
+        async with aiosqlite.connect(self.database_path) as db:
+            await configure_connection(db)
+            cursor = await db.execute(
+                "SELECT last_id, done FROM backfill_progress WHERE name = ?", (backfill.name,)
+            )
+            last_id, done = await cursor.fetchone()
+            if done:
+                return False
+            cursor = await db.execute(backfill.select_sql, (last_id, self.batch_size))
+            rows = await cursor.fetchall()
+
+        if not rows:
+            await self.writer.execute(
+                "UPDATE backfill_progress SET done = 1 WHERE name = ? AND last_id = ?",
+                (backfill.name, last_id)
+            )
+            print(f"Backfill {backfill.name} complete.")
+            return False
+
+        params = await asyncio.to_thread(backfill.compute, rows)
+        next_id = rows[-1][0]
+
+        async def op(db: aiosqlite.Connection):
+            # 他のワーカーが同じバッチを処理済みであれば何も書き込まない
+            cursor = await db.execute(
+                "UPDATE backfill_progress SET last_id = ? WHERE name = ? AND last_id = ?",
+                (next_id, backfill.name, last_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+            await db.executemany(backfill.update_sql, params)
+            return True
+
+        if await self.writer.submit(op):
+            print(f"Backfill {backfill.name}: processed up to id {next_id}.")
+        return True
@@ -0,0 +1,186 @@
+import fcntl
+import os
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# 特徴量を計算する前に縮小するサイズ (一辺のピクセル数)
+COLOR_SAMPLE_SIZE = 64
+# 各チャンネルの量子化レベル数 (4 x 4 x 4 = 64ビンのヒストグラム)
+COLOR_LEVELS = 4
+COLOR_BINS = COLOR_LEVELS ** 3
+# 保存する代表色の数
+DOMINANT_COLORS = 4
+
+# 色検索インデックスの1行 (画像ID, 代表色RGB, 代表色の占有率 0-255)
+COLOR_INDEX_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("colors", "u1", (DOMINANT_COLORS, 3)),
+    ("weights", "u1", (DOMINANT_COLORS,)),
+])
+
+
+def compute_color_features(file_path: str) -> Optional[Tuple[bytes, bytes]]:
+    """
+    画像を COLOR_SAMPLE_SIZE に縮小してから色ヒストグラムと代表色を計算します。
+    PNGは縮小したままデコードできないため、デコード自体は元の解像度で行われます。
+
+    戻り値は (ヒストグラム, 代表色) のバイト列です。ヒストグラムは各ビンの占有率を
+    0-255に正規化したuint8配列、代表色は (R, G, B, 占有率) を DOMINANT_COLORS 個並べたuint8配列です。
+    ワーカープロセスで実行されるため、引数と戻り値はpickle可能な型のみを使います。
+    """
+    try:
+        with Image.open(file_path) as img:
+            img = img.convert("RGB").resize((COLOR_SAMPLE_SIZE, COLOR_SAMPLE_SIZE), Image.Resampling.BOX)
+            pixels = np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+    except Exception as e:
+        print(f"Error computing color features for {file_path}: {e}")
+        return None
+
+    # 各ピクセルを量子化してビン番号に変換
+    shift = 8 - (COLOR_LEVELS.bit_length() - 1)
+    quantized = (pixels >> shift).astype(np.intp)
+    bins = (quantized[:, 0] * COLOR_LEVELS + quantized[:, 1]) * COLOR_LEVELS + quantized[:, 2]
+
+    counts = np.bincount(bins, minlength=COLOR_BINS)
+    total = counts.sum()
+    histogram = np.round(counts * 255.0 / total).astype(np.uint8)
+
+    # 占有率の高いビンのピクセル平均色を代表色とする
+    channel_sums = np.stack(
+        [np.bincount(bins, weights=pixels[:, c], minlength=COLOR_BINS) for c in range(3)],
+        axis=1,
+    )
+    top = np.argsort(counts, kind="stable")[::-1][:DOMINANT_COLORS]
+    dominant = np.zeros((DOMINANT_COLORS, 4), dtype=np.uint8)
+    for i, b in enumerate(top):
+        if counts[b] == 0:
+            break
+        dominant[i, :3] = np.round(channel_sums[b] / counts[b])
+        dominant[i, 3] = round(counts[b] * 255.0 / total)
+
+    return histogram.tobytes(), dominant.tobytes()
+
+
+def parse_hex_color(color: str) -> Tuple[int, int, int]:
+    color = color.lstrip("#")
+    return int(color[0:2], 16), int(color[2:4], 16), int(color[4:6], 16)
+
+
+class ColorIndex:
+    """
+    代表色をまとめたメモリマップ行列で色検索を行うインデックス。
+
+    行列は image_features テーブルから build() で .npy ファイルとして作成し、
+    load() でメモリマップとして読み込みます。他のワーカーがファイルを作り直した場合は
+    検索時に更新日時を見て読み込み直します。
+
+    build() (DBの読み込みからファイルの置き換えまで) と remove() は、インデックスの隣の
+    ロックファイルへのflockで全ワーカー間で直列化します。削除のコミット前にDBを読んだ build() が
+    削除済みの画像を含むファイルで置き換えてしまうことはなく、remove() は必ず最新のファイルに適用されます。
+    """
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._matrix: Optional[np.ndarray] = None
+        self._mtime: Optional[int] = None
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            self._matrix = None
+            self._mtime = None
+            return
+        self._mtime = os.stat(self.index_path).st_mtime_ns
+        self._matrix = np.load(self.index_path, mmap_mode="r")
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.load()
+
+    @contextmanager
+    def _locked(self):
+        with open(self.index_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def build(self, database_path: str):
+        """
+        image_features テーブルから行列を作り直し、原子的にファイルを置き換えます。
+        """
+        with self._locked():
+            self._build(database_path)
+        self.load()
+
+    def _build(self, database_path: str):
+        with sqlite3.connect(database_path) as db:
+            # 空のBLOBはデコードに失敗した画像の目印なので行列には含めない
+            rows = db.execute(
+                """
+                SELECT image_id, dominant_colors FROM image_features
+                WHERE length(dominant_colors) > 0
+                ORDER BY image_id
+                """
+            ).fetchall()
+
+        matrix = np.zeros(len(rows), dtype=COLOR_INDEX_DTYPE)
+        if rows:
+            matrix["id"] = [row[0] for row in rows]
+            dominant = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.uint8)
+            dominant = dominant.reshape(len(rows), DOMINANT_COLORS, 4)
+            matrix["colors"] = dominant[:, :, :3]
+            matrix["weights"] = dominant[:, :, 3]
+
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".color-index-", suffix=".npy", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, matrix)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def remove(self, image_id: int):
+        """
+        削除された画像の占有率をファイル上で0にし、以降の検索に一致しないようにします。
+        ファイルを共有メモリマップで書き換えるため、同じファイルを開いている他のワーカーにも反映されます。
+        """
+        with self._locked():
+            if not os.path.exists(self.index_path):
+                return
+            matrix = np.load(self.index_path, mmap_mode="r+")
+            ids = matrix["id"]
+            position = int(np.searchsorted(ids, image_id))
+            if position < len(ids) and ids[position] == image_id:
+                matrix["weights"][position] = 0
+                matrix.flush()
+
+    def search(self, rgb: Tuple[int, int, int], tolerance: int, min_coverage: float) -> np.ndarray:
+        """
+        指定色から距離 tolerance 以内の代表色の占有率を合計し、min_coverage 以上の画像IDを
+        占有率の高い順に返します。
+        """
+        self._reload_if_changed()
+        if self._matrix is None or len(self._matrix) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        diff = self._matrix["colors"].astype(np.int32) - np.asarray(rgb, dtype=np.int32)
+        distance_sq = np.einsum("nkc,nkc->nk", diff, diff)
+        within = distance_sq <= tolerance * tolerance
+        scores = (self._matrix["weights"].astype(np.int32) * within).sum(axis=1)
+
+        matched = np.flatnonzero(scores >= max(1, round(min_coverage * 255)))
+        order = np.argsort(-scores[matched], kind="stable")
+        return np.asarray(self._matrix["id"][matched[order]])
@@ -1,6 +1,6 @@
 import datetime
 import os
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, DateTime, Text, insert
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, DateTime, Text, LargeBinary, ForeignKey, Boolean, insert
 from sqlalchemy.orm import sessionmaker
 
 metadata = MetaData()
@@ -16,6 +16,52 @@ images_table = Table(
     Column("created_at", DateTime, default=datetime.datetime.now),
     Column("parameters", Text),
     Column("search_text", Text),
+    # parametersから抽出したモデル名 (NULLはバックフィル未処理、空文字はモデル名なし)
+    Column("model", String, index=True),
+)
+
+# `image_features`テーブルのスキーマを定義 (色ヒストグラムと代表色)
+# 両方のBLOBが空の行はデコードに失敗した画像の目印。ヒストグラムは現在の色検索では使わず、将来の類似検索用に保存している
+image_features_table = Table(
+    "image_features",
+    metadata,
+    Column("image_id", Integer, ForeignKey("images.id", ondelete="CASCADE"), primary_key=True),
+    Column("histogram", LargeBinary, nullable=False),
+    Column("dominant_colors", LargeBinary, nullable=False),
+)
+
+# `backfill_progress`テーブルのスキーマを定義 (バックフィルの再開位置)
+backfill_progress_table = Table(
+    "backfill_progress",
+    metadata,
+    Column("name", String, primary_key=True),
+    Column("last_id", Integer, nullable=False, default=0),
+    Column("done", Boolean, nullable=False, default=False),
+)
+
+# `albums`テーブルのスキーマを定義 (スマートアルバムの条件)
+albums_table = Table(
+    "albums",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("query", String),
+    Column("model", String),
+    Column("min_rating", Integer, nullable=False, default=0),
+    Column("max_age_days", Integer),
+    Column("created_at", DateTime, default=datetime.datetime.now),
+    # 作成時点の既存画像の評価状況 (populate_max_id までをバックグラウンドで評価する)
+    Column("populating", Boolean, nullable=False, default=False, server_default="0"),
+    Column("populated_last_id", Integer, nullable=False, default=0, server_default="0"),
+    Column("populate_max_id", Integer, nullable=False, default=0, server_default="0"),
+)
+
+# `album_images`テーブルのスキーマを定義 (スマートアルバムの所属表)
+album_images_table = Table(
+    "album_images",
+    metadata,
+    Column("album_id", Integer, ForeignKey("albums.id", ondelete="CASCADE"), primary_key=True),
+    Column("image_id", Integer, ForeignKey("images.id", ondelete="CASCADE"), primary_key=True, index=True),
 )
 
 # `prompt_elements`テーブルのスキーマを定義
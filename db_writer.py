@@ -0,0 +1,148 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import aiosqlite
+
+# 1回のグループコミットでまとめる最大操作数
+WRITER_MAX_BATCH = 256
+# 最初の操作を受け取ってからコミットするまでの最大待ち時間 (秒)
+WRITER_MAX_DELAY = 0.01
+# 他プロセス (別のuvicornワーカー) が書き込み中の場合に待つ時間 (ミリ秒)
+SQLITE_BUSY_TIMEOUT_MS = 10000
+
+WriteOp = Callable[[aiosqlite.Connection], Awaitable[Any]]
+
+
+async def configure_connection(db: aiosqlite.Connection):
+    """
+    WALモードとbusy_timeoutを設定し、読み取りと書き込みが互いをブロックしないようにします。
+    """
+    await db.execute("PRAGMA journal_mode=WAL")
+    await db.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    await db.execute("PRAGMA synchronous=NORMAL")
+
+
+class DBWriter:
+    """
+    プロセス内の全ての書き込みを1つの接続・1つのタスクに集約するライター。
+
+    呼び出し元は submit() / execute() で操作をキューに積み、結果を待ちます。
+    ライタータスクはキューに溜まった操作を1トランザクションにまとめて
+    コミット (グループコミット) し、各呼び出し元に結果または例外を返します。
+    各操作はSAVEPOINT内で実行されるため、1つの失敗が他の操作を巻き込みません。
+    """
+
+    def __init__(self, database_path: str,
+                 max_batch: int = WRITER_MAX_BATCH,
+                 max_delay: float = WRITER_MAX_DELAY):
+        self.database_path = database_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._db: Optional[aiosqlite.Connection] = None
+
+    async def start(self):
+        # isolation_level=None でトランザクションを明示的に管理する
+        self._db = await aiosqlite.connect(self.database_path, isolation_level=None)
+        await configure_connection(self._db)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            # キューに残っている操作を全て処理してから停止する
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db:
+            await self._db.close()
+            self._db = None
+
+    async def submit(self, op: WriteOp) -> Any:
+        """
+        接続を受け取る非同期関数 op をグループコミットに載せて実行し、その戻り値を返します。
+        op の中でcommit/rollbackを呼んではいけません。
+        """
+        if self._task is None or self._task.done():
+            raise RuntimeError("DBWriter is not running.")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((op, future))
+        return await future
+
+    async def execute(self, sql: str, params: tuple = ()) -> int:
+        """
+        1つのSQL文をグループコミットに載せて実行し、影響を受けた行数を返します。
+        """
+        async def op(db: aiosqlite.Connection):
+            cursor = await db.execute(sql, params)
+            return cursor.rowcount
+        return await self.submit(op)
+
+    async def _collect_batch(self):
+        # 最初の1件が来るまで待ち、その後は max_delay の間に来た操作をまとめる
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._commit_batch(batch)
+            except Exception as e:
+                # ROLLBACK自体の失敗などでもタスクを止めず、未応答の呼び出し元にはエラーを返す
+                print(f"Writer failed while committing {len(batch)} operations: {e}")
+                for op, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit_batch(self, batch):
+        db = self._db
+        results = []
+        try:
+            # BEGIN IMMEDIATE で書き込みロックを先に取得する (他ワーカーとはbusy_timeoutで待ち合わせ)
+            await db.execute("BEGIN IMMEDIATE")
+            for op, future in batch:
+                await db.execute("SAVEPOINT write_op")
+                try:
+                    result = await op(db)
+                    await db.execute("RELEASE write_op")
+                    results.append((future, result, None))
+                except Exception as e:
+                    await db.execute("ROLLBACK TO write_op")
+                    await db.execute("RELEASE write_op")
+                    results.append((future, None, e))
+            await db.execute("COMMIT")
+        except Exception as e:
+            # トランザクション自体が失敗した場合はバッチ内の全操作をエラーとして返す
+            print(f"Group commit failed for {len(batch)} operations: {e}")
+            if db.in_transaction:
+                await db.execute("ROLLBACK")
+            for op, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, result, error in results:
+            if future.done():  # 呼び出し元がキャンセル済み
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
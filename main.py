@@ -9,13 +9,36 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import asyncio
+import json
 import png
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from color_features import ColorIndex, compute_color_features, parse_hex_color
+from db_writer import DBWriter, configure_connection
+from backfill import Backfill, BackfillRunner
+from parameters_parser import escape_like, parse_model_name, split_search_terms
+from smart_albums import (
+    AlbumCreate, AlbumPopulator, add_image_memberships, load_predicates,
+    refresh_image_memberships, remove_image_memberships,
+)
+from png_rating import RATING_CHUNK_KEY, RatingWriteBack, parse_rating_value
 
 # データベースファイルのパス
 DATABASE_PATH = "db/image_metadata.db"
 # 画像ディレクトリのパス (Docker Composeでマウントされる)
 IMAGE_DIR = "images"
 
+# 同期時に1回の書き込み操作でまとめて挿入する件数
+SYNC_INSERT_CHUNK_SIZE = 200
+# 評価をPNGのtEXtチャンクにも書き戻すかどうか (RATING_WRITEBACK=1 で有効)
+RATING_WRITEBACK_ENABLED = os.environ.get("RATING_WRITEBACK", "0") == "1"
+# 色検索用の代表色行列ファイルのパス (起動時にメモリマップで読み込む)
+COLOR_INDEX_PATH = "db/color_index.npy"
+# 色検索のデフォルトの許容距離 (RGB空間のユークリッド距離)
+COLOR_DEFAULT_TOLERANCE = 60
+# 色検索でヒットとみなす、指定色に近い代表色の最小占有率
+COLOR_MIN_COVERAGE = 0.1
+
 # 評価更新用のPydanticモデル
 class RatingUpdate(BaseModel):
     rating: int
@@ -28,8 +51,40 @@ class PromptElement(BaseModel):
     value: str # 新しいプロンプト値（英単語）
     type: str # 'radio' or 'checkbox'
 
+# 書き込みは全てこのライター経由でグループコミットする
+db_writer = DBWriter(DATABASE_PATH)
+# 評価変更をまとめてPNGに書き戻すバックグラウンドタスク
+rating_writeback = RatingWriteBack(IMAGE_DIR, DATABASE_PATH)
+# 派生カラムを既存行に埋めるバックグラウンドのバックフィル
+backfill_runner = BackfillRunner(DATABASE_PATH, db_writer)
+# 作成直後のスマートアルバムに既存画像を振り分けるバックグラウンドタスク
+album_populator = AlbumPopulator(DATABASE_PATH, db_writer)
+# 色特徴量の計算を行うワーカープロセス
+feature_executor = ProcessPoolExecutor()
+# 色検索インデックス
+color_index = ColorIndex(COLOR_INDEX_PATH)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db_writer.start()
+    await backfill_runner.start()
+    await album_populator.start()
+    if os.path.exists(COLOR_INDEX_PATH):
+        color_index.load()
+    else:
+        await asyncio.to_thread(color_index.build, DATABASE_PATH)
+    if RATING_WRITEBACK_ENABLED:
+        await rating_writeback.start()
+    yield
+    await backfill_runner.stop()
+    await album_populator.stop()
+    if RATING_WRITEBACK_ENABLED:
+        await rating_writeback.stop()
+    await db_writer.stop()
+    feature_executor.shutdown()
+
 # FastAPIアプリケーションのインスタンスを作成
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS設定 (フロントエンドからのアクセスを許可)
 origins = [
@@ -48,11 +103,29 @@ app.add_middleware(
 # 静的ファイルとして画像をマウント (コンテナ内の/app/imagesを/imagesとして公開)
 app.mount("/images", StaticFiles(directory=IMAGE_DIR), name="images")
 
+# 接続にSQL関数を登録する関数 (バックフィル未処理の行をアプリと同じ規則で扱うため)
+async def register_sql_functions(db: aiosqlite.Connection):
+    await db.create_function("parse_model", 1, parse_model_name, deterministic=True)
+
+# 既存行のモデル名を埋めるバックフィル
+def compute_model_names(rows):
+    return [(parse_model_name(parameters), image_id) for image_id, parameters in rows]
+
+backfill_runner.register(Backfill(
+    "images.model",
+    "images",
+    "SELECT id, parameters FROM images WHERE id > ? ORDER BY id LIMIT ?",
+    compute_model_names,
+    "UPDATE images SET model = ? WHERE id = ?",
+))
+
 # PNGファイルからメタデータを抽出する関数
 def extract_metadata(file_path: str):
     prompt = ""
     negative_prompt = ""
     parameters_raw = ""
+    rating = None # PNGに書き戻された評価 (無ければNone)
+    found_parameters = False
 
     try:
         with open(file_path, 'rb') as f:
@@ -60,6 +133,10 @@ def extract_metadata(file_path: str):
             
             # PNGチャンクを走査して'tEXt'チャンクからパラメータを抽出
             for chunk_type, chunk_data in reader.chunks():
+                # 評価チャンクはIDATより前に書き込むため、パラメータ取得済みならここで終了
+                if chunk_type == b'IDAT' and found_parameters:
+                    break
+
                 if chunk_type == b'tEXt':
                     text_str = chunk_data.decode('latin-1')
                     key, value = text_str.split('\x00', 1)
@@ -74,7 +151,13 @@ def extract_metadata(file_path: str):
                             if line.startswith("Negative prompt:"):
                                 negative_prompt = line.replace("Negative prompt:", "").strip()
                         
-                        break # パラメータチャンクが見つかったら終了
+                        found_parameters = True
+                    elif key == RATING_CHUNK_KEY:
+                        # 他のツールが書いた0-5以外の値は無視する
+                        rating = parse_rating_value(value)
+
+                    if found_parameters and rating is not None:
+                        break # パラメータと評価の両方が見つかったら終了
     
     except Exception as e:
         print(f"Error reading PNG metadata for {file_path}: {e}")
@@ -82,7 +165,8 @@ def extract_metadata(file_path: str):
     return {
         "prompt": prompt,
         "negative_prompt": negative_prompt,
-        "parameters": parameters_raw
+        "parameters": parameters_raw,
+        "rating": rating
     }
 
 # --- 変更点：データベース接続を依存性注入で管理 ---
@@ -91,6 +175,7 @@ async def get_db():
     if not os.path.exists(DATABASE_PATH):
         raise HTTPException(status_code=500, detail="Database file not found.")
     async with aiosqlite.connect(DATABASE_PATH) as db:
+        await configure_connection(db)
         yield db
 
 # --- 変更点：/api/prompt_elementsエンドポイントをDBから取得するよう修正 ---
@@ -116,6 +201,78 @@ async def get_prompt_elements(db: aiosqlite.Connection = Depends(get_db)):
     except aiosqlite.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {e}")
 
+# 画像行をまとめて挿入する書き込み操作を作成する関数
+def insert_image_rows(rows):
+    async def op(db: aiosqlite.Connection):
+        inserted = 0
+        # スマートアルバムの条件は挿入のたびではなく1回だけ読み込む
+        predicates = await load_predicates(db)
+        for row in rows:
+            filename = row[0]
+            try:
+                # データベースに挿入
+                cursor = await db.execute(
+                    """
+                    INSERT INTO images (
+                        filename, image_path, created_at, parameters, search_text, rating, model
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    row
+                )
+                # 新しい画像をアルバムの条件だけで評価して所属表に追加
+                _, _, _, parameters_raw, search_text_data, rating, model = row
+                await add_image_memberships(db, cursor.lastrowid, search_text_data,
+                                            model, parameters_raw, rating, predicates)
+                print(f"Successfully inserted {filename} into database.")
+                inserted += 1
+            except Exception as e:
+                print(f"Error inserting {filename} into database: {e}")
+        return inserted
+    return op
+
+# 色特徴量をまとめて保存する書き込み操作を作成する関数
+def insert_feature_rows(rows):
+    async def op(db: aiosqlite.Connection):
+        await db.executemany(
+            "INSERT OR REPLACE INTO image_features (image_id, histogram, dominant_colors) VALUES (?, ?, ?)",
+            rows
+        )
+        return len(rows)
+    return op
+
+# 色特徴量が未計算の画像についてワーカープロセスで計算し、保存する関数
+async def sync_color_features():
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            """
+            SELECT images.id, images.image_path
+            FROM images
+            LEFT JOIN image_features ON image_features.image_id = images.id
+            WHERE image_features.image_id IS NULL
+            """
+        )
+        missing = await cursor.fetchall()
+
+    print(f"Computing color features for {len(missing)} images.")
+    loop = asyncio.get_running_loop()
+    computed_count = 0
+    for start in range(0, len(missing), SYNC_INSERT_CHUNK_SIZE):
+        chunk = missing[start:start + SYNC_INSERT_CHUNK_SIZE]
+        features = await asyncio.gather(*[
+            loop.run_in_executor(feature_executor, compute_color_features, os.path.join(IMAGE_DIR, image_path))
+            for _, image_path in chunk
+        ])
+        # デコードに失敗した画像は空のBLOBを目印として保存し、次回以降の同期で再計算しない
+        rows = [(image_id, f[0], f[1]) if f is not None else (image_id, b"", b"")
+                for (image_id, _), f in zip(chunk, features)]
+        if rows:
+            computed_count += await db_writer.submit(insert_feature_rows(rows))
+
+    # 特徴量が増えた場合は色検索インデックスを作り直す
+    if computed_count:
+        await asyncio.to_thread(color_index.build, DATABASE_PATH)
+    return computed_count
+
 # 画像同期APIエンドポイント
 @app.post("/api/images/sync")
 async def sync_images_to_db():
@@ -134,6 +291,7 @@ async def sync_images_to_db():
         print(f"Found {len(new_files)} new images to process.")
         
         synced_count = 0
+        pending_rows = []
         
         for file_path in new_files:
             # IMAGE_DIRを基準とした相対パスを取得
@@ -151,26 +309,65 @@ async def sync_images_to_db():
             file_mtime_timestamp = os.path.getmtime(file_path)
             file_datetime = datetime.datetime.fromtimestamp(file_mtime_timestamp)
             
-            try:
-                # データベースに挿入
-                await db.execute(
-                    """
-                    INSERT INTO images (
-                        filename, image_path, created_at, parameters, search_text, rating
-                    ) VALUES (?, ?, ?, ?, ?, ?)
-                    """,
-                    (filename, relative_path, file_datetime, 
-                     parameters_raw, search_text_data, 0)
-                )
-                print(f"Successfully inserted {filename} into database.")
-                synced_count += 1
-            except Exception as e:
-                print(f"Error inserting {filename} into database: {e}")
+            # PNGに書き戻された評価があれば復元する
+            rating = metadata["rating"] if metadata["rating"] is not None else 0
 
-        await db.commit() # 変更をコミット
+            pending_rows.append((filename, relative_path, file_datetime,
+                                 parameters_raw, search_text_data, rating,
+                                 parse_model_name(parameters_raw)))
+            if len(pending_rows) >= SYNC_INSERT_CHUNK_SIZE:
+                synced_count += await db_writer.submit(insert_image_rows(pending_rows))
+                pending_rows = []
+
+        if pending_rows:
+            synced_count += await db_writer.submit(insert_image_rows(pending_rows))
+
+    await sync_color_features()
     print(f"--- Database sync complete. Synced {synced_count} new images. ---")
     return {"message": f"Synced {synced_count} new images."}
 
+# バックフィル進捗取得APIエンドポイント
+@app.get("/api/backfills")
+async def get_backfill_progress():
+    return await backfill_runner.progress()
+
+# 色検索の一致結果 (一致度順の画像ID配列) から1ページ分の画像を取得する関数
+async def list_color_matches(db: aiosqlite.Connection, matched_ids, offset: int, limit: int):
+    page_ids = matched_ids[offset:offset + limit].tolist()
+    cursor = await db.execute(
+        """
+        SELECT
+            id, filename, image_path, rating, parameters
+        FROM
+            images
+        WHERE
+            id IN (SELECT value FROM json_each(?))
+        """,
+        (json.dumps(page_ids),)
+    )
+    rows_by_id = {row[0]: row for row in await cursor.fetchall()}
+
+    cursor = await db.execute("SELECT COUNT(*) FROM images")
+    total_database_count = (await cursor.fetchone())[0]
+
+    images = []
+    for image_id in page_ids: # 一致度順を保つ
+        row = rows_by_id.get(image_id)
+        if row:
+            images.append({
+                "id": row[0],
+                "filename": row[1],
+                "image_path": row[2],
+                "rating": row[3],
+                "parameters": row[4]
+            })
+
+    return {
+        "images": images,
+        "total_search_results_count": len(matched_ids),
+        "total_database_count": total_database_count
+    }
+
 # 画像リストと検索APIエンドポイント
 @app.get("/api/images")
 async def list_images_and_search(
@@ -178,43 +375,68 @@ async def list_images_and_search(
     page: int = Query(1, ge=1), # ページ番号 (1以上)
     limit: int = Query(20, ge=1), # 1ページあたりの表示件数 (1以上)
     sort_by: Optional[str] = Query("created_at", pattern="^(created_at|rating)$"), # ソート基準 (デフォルトはcreated_at)
-    sort_order: Optional[str] = Query("desc", pattern="^(asc|desc)$") # ソート順序 (デフォルトは降順)
+    sort_order: Optional[str] = Query("desc", pattern="^(asc|desc)$"), # ソート順序 (デフォルトは降順)
+    model: Optional[str] = None, # モデル名での絞り込み
+    color: Optional[str] = Query(None, pattern="^#[0-9a-fA-F]{6}$"), # 色検索 (#RRGGBB)
+    tolerance: int = Query(COLOR_DEFAULT_TOLERANCE, ge=0, le=442) # 色検索の許容距離
 ):
     offset = (page - 1) * limit # オフセットを計算
     async with aiosqlite.connect(DATABASE_PATH) as db:
+        await register_sql_functions(db)
         
         # --- ここからAND検索ロジック ---
         where_clauses = []
         params = []
         if query:
             # クエリ文字列をスペースで分割し、空の要素を削除
-            search_terms = query.lower().split()
+            # 検索語はワイルドカードとして扱わず文字どおりに一致させる (スマートアルバムと同じ規則)
+            search_terms = split_search_terms(query)
             if search_terms:
-                where_clauses = [f"LOWER(search_text) LIKE ?" for _ in search_terms]
-                params = [f"%{term}%" for term in search_terms]
+                where_clauses = [f"LOWER(search_text) LIKE ? ESCAPE '\\'" for _ in search_terms]
+                params = [f"%{escape_like(term)}%" for term in search_terms]
+
+        if model:
+            # バックフィル未処理の行 (model IS NULL) はバックフィルと同じ関数でその場で抽出する
+            # COALESCE(model, parse_model(parameters)) = ? と同じ条件だが、処理済みの行ではmodelのインデックスを使える
+            where_clauses.append("(model = ? OR (model IS NULL AND parse_model(parameters) = ?))")
+            params += [model, model]
         
         where_clause_str = " AND ".join(where_clauses)
         if where_clause_str:
             where_clause_str = f"WHERE {where_clause_str}"
 
+        # ソート条件のORDER BY句を構築
+        order_by_clause = f"ORDER BY {sort_by} {sort_order}"
+
+        # 色検索: 代表色行列をスキャンして一致した画像IDを一致度順に取得する (イベントループを止めないようスレッドで実行)
+        from_clause_str = "images"
+        if color:
+            matched_ids = await asyncio.to_thread(
+                color_index.search, parse_hex_color(color), tolerance, COLOR_MIN_COVERAGE
+            )
+            if not where_clauses:
+                # 他の条件が無ければ件数とページはNumPy側で決まるため、ページ分のIDだけをDBから引く
+                return await list_color_matches(db, matched_ids, offset, limit)
+            # 他の条件と組み合わせる場合はJSON配列として結合する
+            from_clause_str = "images JOIN json_each(?) AS color_match ON color_match.value = images.id"
+            params = [json.dumps(matched_ids.tolist())] + params
+            order_by_clause = "ORDER BY color_match.key"
+
         # 検索結果の総件数を取得
-        cursor = await db.execute(f"SELECT COUNT(*) FROM images {where_clause_str}", tuple(params))
+        cursor = await db.execute(f"SELECT COUNT(*) FROM {from_clause_str} {where_clause_str}", tuple(params))
         total_search_results_count = (await cursor.fetchone())[0]
 
         # データベース全体の総件数を取得
         cursor = await db.execute("SELECT COUNT(*) FROM images")
         total_database_count = (await cursor.fetchone())[0]
 
-        # ソート条件のORDER BY句を構築
-        order_by_clause = f"ORDER BY {sort_by} {sort_order}"
-
         # 画像リストを取得
         cursor = await db.execute(
             f"""
             SELECT
-                id, filename, image_path, rating, parameters
+                images.id, filename, image_path, rating, parameters
             FROM
-                images
+                {from_clause_str}
             {where_clause_str}
             {order_by_clause}
             LIMIT ? OFFSET ?
@@ -247,7 +469,7 @@ async def get_image_detail(image_id: int):
         cursor = await db.execute(
             """
             SELECT
-                id, filename, image_path, rating, created_at, parameters
+                id, filename, image_path, rating, created_at, parameters, model
             FROM
                 images
             WHERE
@@ -265,6 +487,8 @@ async def get_image_detail(image_id: int):
                 "rating": row[3],
                 "created_at": row[4],
                 "parameters": row[5],
+                # バックフィル未処理の行はその場で抽出する
+                "model": row[6] if row[6] is not None else parse_model_name(row[5]),
             }
             return image_detail
         else: # 画像が見つからない場合
@@ -278,13 +502,19 @@ async def update_image_rating(image_id: int, rating_update: RatingUpdate):
         raise HTTPException(status_code=400, detail="Invalid rating value. Must be an integer between 0 and 5.")
 
     try:
-        async with aiosqlite.connect(DATABASE_PATH) as db:
-            # データベースの評価を更新
+        # データベースの評価を更新 (ライターが他の書き込みとまとめてコミットする)
+        async def op(db: aiosqlite.Connection):
             await db.execute(
                 "UPDATE images SET rating = ? WHERE id = ?",
                 (rating_update.rating, image_id)
             )
-            await db.commit() # 変更をコミット
+            await refresh_image_memberships(db, image_id)
+            cursor = await db.execute("SELECT image_path FROM images WHERE id = ?", (image_id,))
+            return await cursor.fetchone()
+
+        row = await db_writer.submit(op)
+        if row and RATING_WRITEBACK_ENABLED:
+            rating_writeback.schedule(row[0])
         return {"message": f"Image {image_id} rating updated successfully."}
     except Exception as e:
         print(f"An error occurred while updating rating for image_id={image_id}: {e}")
@@ -306,17 +536,21 @@ async def delete_image(image_id: int):
         image_full_path = os.path.join(IMAGE_DIR, image_relative_path)
 
         try:
-            # 2. ディスクから画像ファイルを削除
-            if os.path.exists(image_full_path):
-                os.remove(image_full_path)
+            # 2. ディスクから画像ファイルを削除 (評価の書き戻しとはロックで直列化する)
+            if await asyncio.to_thread(rating_writeback.remove_file, image_relative_path):
                 print(f"Successfully deleted file: {image_full_path}")
             else:
                 # ファイルが見つからないがDBエントリは削除する場合
                 print(f"Warning: File not found on disk, but entry exists in DB: {image_full_path}")
             
             # 3. データベースからエントリを削除
-            await db.execute("DELETE FROM images WHERE id = ?", (image_id,))
-            await db.commit() # 変更をコミット
+            async def op(db: aiosqlite.Connection):
+                await db.execute("DELETE FROM image_features WHERE image_id = ?", (image_id,))
+                await remove_image_memberships(db, image_id)
+                await db.execute("DELETE FROM images WHERE id = ?", (image_id,))
+            await db_writer.submit(op)
+            # 色検索の行列からも除外し、件数がすぐに正しくなるようにする
+            await asyncio.to_thread(color_index.remove, image_id)
             
             return {"message": f"Image {image_id} and its file have been successfully deleted."}
         except OSError as e: # ファイル操作に関するエラー
@@ -325,3 +559,143 @@ async def delete_image(image_id: int):
         except Exception as e: # その他のデータベースエラー
             print(f"Error deleting image {image_id} from database: {e}")
             raise HTTPException(status_code=500, detail="Failed to delete image entry from database.")
+
+# スマートアルバムの情報を辞書に変換する関数
+def album_to_dict(row, image_count):
+    return {
+        "id": row[0],
+        "name": row[1],
+        "query": row[2],
+        "model": row[3],
+        "min_rating": row[4],
+        "max_age_days": row[5],
+        "image_count": image_count,
+        # Trueの間は既存画像の振り分け中のため、image_countは確定値ではない
+        "populating": bool(row[6]),
+    }
+
+# アルバムの所属画像数を取得する関数 (作成日時の絞り込みがある場合は表示時に適用)
+async def count_album_images(db: aiosqlite.Connection, album_id: int, max_age_days: Optional[int]):
+    if max_age_days is None:
+        cursor = await db.execute("SELECT COUNT(*) FROM album_images WHERE album_id = ?", (album_id,))
+    else:
+        cursor = await db.execute(
+            """
+            SELECT COUNT(*)
+            FROM album_images JOIN images ON images.id = album_images.image_id
+            WHERE album_images.album_id = ? AND images.created_at >= ?
+            """,
+            (album_id, datetime.datetime.now() - datetime.timedelta(days=max_age_days))
+        )
+    return (await cursor.fetchone())[0]
+
+# スマートアルバム作成APIエンドポイント
+@app.post("/api/albums")
+async def create_album(album: AlbumCreate):
+    if album.min_rating < 0 or album.min_rating > 5:
+        raise HTTPException(status_code=400, detail="Invalid rating value. Must be an integer between 0 and 5.")
+    if album.max_age_days is not None and album.max_age_days < 1:
+        raise HTTPException(status_code=400, detail="max_age_days must be a positive integer.")
+
+    # 条件の保存だけを短い書き込み操作で行う。以降に追加・変更された画像は同期や評価更新の中で評価され、
+    # 作成時点の既存画像 (最大idまで) はバックグラウンドでバッチごとに評価する
+    async def op(db: aiosqlite.Connection):
+        cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM images")
+        max_id = (await cursor.fetchone())[0]
+        cursor = await db.execute(
+            """
+            INSERT INTO albums (
+                name, query, model, min_rating, max_age_days, created_at,
+                populating, populated_last_id, populate_max_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)
+            """,
+            (album.name, album.query, album.model, album.min_rating,
+             album.max_age_days, datetime.datetime.now(), 1 if max_id else 0, max_id)
+        )
+        return cursor.lastrowid
+
+    album_id = await db_writer.submit(op)
+    album_populator.notify()
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            "SELECT id, name, query, model, min_rating, max_age_days, populating FROM albums WHERE id = ?",
+            (album_id,)
+        )
+        row = await cursor.fetchone()
+        return album_to_dict(row, await count_album_images(db, album_id, row[5]))
+
+# スマートアルバム一覧取得APIエンドポイント
+@app.get("/api/albums")
+async def list_albums():
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute(
+            "SELECT id, name, query, model, min_rating, max_age_days, populating FROM albums ORDER BY id"
+        )
+        rows = await cursor.fetchall()
+        return [album_to_dict(row, await count_album_images(db, row[0], row[5])) for row in rows]
+
+# スマートアルバムの画像リスト取得APIエンドポイント
+@app.get("/api/albums/{album_id}/images")
+async def list_album_images(
+    album_id: int,
+    page: int = Query(1, ge=1), # ページ番号 (1以上)
+    limit: int = Query(20, ge=1), # 1ページあたりの表示件数 (1以上)
+    sort_by: Optional[str] = Query("created_at", pattern="^(created_at|rating)$"), # ソート基準
+    sort_order: Optional[str] = Query("desc", pattern="^(asc|desc)$") # ソート順序
+):
+    offset = (page - 1) * limit # オフセットを計算
+    async with aiosqlite.connect(DATABASE_PATH) as db:
+        cursor = await db.execute("SELECT max_age_days, populating FROM albums WHERE id = ?", (album_id,))
+        album_row = await cursor.fetchone()
+        if not album_row:
+            raise HTTPException(status_code=404, detail="Album not found")
+        max_age_days = album_row[0]
+
+        # 所属表から主キーで画像を引く (検索条件の再実行は行わない)
+        where_clause_str = "WHERE album_images.album_id = ?"
+        params = [album_id]
+        if max_age_days is not None:
+            where_clause_str += " AND images.created_at >= ?"
+            params.append(datetime.datetime.now() - datetime.timedelta(days=max_age_days))
+
+        cursor = await db.execute(
+            f"""
+            SELECT
+                images.id, filename, image_path, rating, parameters
+            FROM
+                album_images JOIN images ON images.id = album_images.image_id
+            {where_clause_str}
+            ORDER BY {sort_by} {sort_order}
+            LIMIT ? OFFSET ?
+            """,
+            tuple(params + [limit, offset])
+        )
+        rows = await cursor.fetchall()
+
+        images = []
+        for row in rows:
+            images.append({
+                "id": row[0],
+                "filename": row[1],
+                "image_path": row[2],
+                "rating": row[3],
+                "parameters": row[4]
+            })
+
+        return {
+            "images": images,
+            "total_search_results_count": await count_album_images(db, album_id, max_age_days),
+            "populating": bool(album_row[1]),
+        }
+
+# スマートアルバム削除APIエンドポイント
+@app.delete("/api/albums/{album_id}")
+async def delete_album(album_id: int):
+    async def op(db: aiosqlite.Connection):
+        await db.execute("DELETE FROM album_images WHERE album_id = ?", (album_id,))
+        cursor = await db.execute("DELETE FROM albums WHERE id = ?", (album_id,))
+        return cursor.rowcount
+
+    if not await db_writer.submit(op):
+        raise HTTPException(status_code=404, detail="Album not found")
+    return {"message": f"Album {album_id} has been successfully deleted."}
@@ -0,0 +1,26 @@
+import re
+
+
+# parametersからモデル名を抽出する関数 (見つからない場合は空文字)
+def parse_model_name(parameters_raw: str) -> str:
+    match = re.search(r"(?:^|[\s,])Model: ([^,\n]+)", parameters_raw or "")
+    return match.group(1).strip() if match else ""
+
+
+# SQLiteのLOWER()と同じくASCIIの大文字だけを小文字にする変換表
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+# SQLiteのLOWER()と同じ規則で小文字にする関数
+def ascii_lower(text: str) -> str:
+    return (text or "").translate(_ASCII_LOWER)
+
+
+# 検索クエリをAND検索語に分割する関数 (画像検索とスマートアルバムで共通)
+def split_search_terms(query: str) -> list:
+    return ascii_lower(query).split()
+
+
+# LIKEのワイルドカード (% と _) をエスケープする関数 (ESCAPE '\' と組み合わせて使う)
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,249 @@
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import zlib
+from contextlib import contextmanager
+from typing import Optional, Set
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+# 評価を書き込むtEXtチャンクのキーワード
+RATING_CHUNK_KEY = "rating"
+# バックグラウンド書き戻しの間隔 (秒)
+RATING_WRITEBACK_INTERVAL = 2.0
+# 書き戻しと画像削除を全ワーカーで直列化するロックファイル (IMAGE_DIR内に作成)
+RATING_WRITEBACK_LOCK_FILE = ".rating-writeback.lock"
+# 評価として受け付ける値の範囲 (APIの評価更新と同じ)
+MIN_RATING = 0
+MAX_RATING = 5
+
+
+def parse_rating_value(value: str) -> Optional[int]:
+    """
+    評価チャンクの値を整数に変換します。0-5の範囲外や数値でない場合はNoneを返します。
+    """
+    value = value.strip()
+    if not value.isdigit():
+        return None
+    rating = int(value)
+    return rating if MIN_RATING <= rating <= MAX_RATING else None
+
+
+def _make_text_chunk(key: str, value: str) -> bytes:
+    data = key.encode('latin-1') + b'\x00' + value.encode('latin-1')
+    crc = zlib.crc32(b'tEXt' + data) & 0xffffffff
+    return struct.pack(">I", len(data)) + b'tEXt' + data + struct.pack(">I", crc)
+
+
+def _iter_chunk_headers(f):
+    """
+    PNGのチャンクを (オフセット, 長さ, 種別) で順に返します。データ部は読み飛ばします。
+    """
+    if f.read(8) != PNG_SIGNATURE:
+        raise ValueError("Not a PNG file.")
+    while True:
+        offset = f.tell()
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        length, chunk_type = struct.unpack(">I4s", header)
+        yield offset, length, chunk_type
+        f.seek(offset + 12 + length)
+        if chunk_type == b'IEND':
+            return
+
+
+def _find_rating_chunk(f):
+    """
+    最初のIDATより前にある評価チャンクを探し、(オフセット, 長さ, 値, 最初のIDATのオフセット) を返します。
+    """
+    for offset, length, chunk_type in _iter_chunk_headers(f):
+        if chunk_type == b'IDAT':
+            return None, None, None, offset
+        if chunk_type == b'tEXt':
+            f.seek(offset + 8)
+            data = f.read(length)
+            key, _, value = data.partition(b'\x00')
+            if key.decode('latin-1') == RATING_CHUNK_KEY:
+                return offset, length, value.decode('latin-1'), None
+    return None, None, None, None
+
+
+def write_rating_chunk(file_path: str, rating: int) -> bool:
+    """
+    PNGの評価チャンクを書き換えます。画素データ (IDAT) は再エンコードせずそのままコピーします。
+
+    チャンク単位でコピーした一時ファイルで評価チャンクを置き換え (無ければ挿入し)、原子的に置き換えます。
+    配信中のファイルが書きかけの状態で見えることはありません。
+    ファイルの更新日時は保持します。内容が変わった場合はTrueを返します。
+    """
+    value = str(rating)
+    new_chunk = _make_text_chunk(RATING_CHUNK_KEY, value)
+    stat = os.stat(file_path)
+
+    with open(file_path, 'rb') as f:
+        offset, length, current, idat_offset = _find_rating_chunk(f)
+        if current == value:
+            return False
+
+    _rewrite_with_chunk(file_path, new_chunk, offset, length, idat_offset)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return True
+
+
+def _rewrite_with_chunk(file_path, new_chunk, old_offset, old_length, insert_offset):
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".rating-", suffix=".png.tmp", dir=directory)
+    try:
+        with open(file_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            if old_offset is not None:
+                # 既存の評価チャンクを新しいチャンクで置き換える
+                shutil.copyfileobj(_LimitedReader(src, old_offset), dst)
+                dst.write(new_chunk)
+                src.seek(old_offset + 12 + old_length)
+            else:
+                # 最初のIDATの直前 (IDATが無ければIENDの直前) に挿入する
+                if insert_offset is None:
+                    insert_offset = _find_iend_offset(src)
+                shutil.copyfileobj(_LimitedReader(src, insert_offset), dst)
+                dst.write(new_chunk)
+            shutil.copyfileobj(src, dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _find_iend_offset(f):
+    f.seek(0)
+    for offset, _, chunk_type in _iter_chunk_headers(f):
+        if chunk_type == b'IEND':
+            return offset
+    raise ValueError("PNG has no IEND chunk.")
+
+
+class _LimitedReader:
+    """先頭から指定バイト数だけを読み出すファイルラッパー。"""
+
+    def __init__(self, f, limit):
+        f.seek(0)
+        self._f = f
+        self._remaining = limit
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b''
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._f.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+class RatingWriteBack:
+    """
+    評価が変更された画像をためておき、一定間隔でまとめてPNGに書き戻すバックグラウンドタスク。
+
+    ためておくのは画像のパスだけで、書き込む評価は書き戻し時にDBから読み直します。
+    書き戻しと画像ファイルの削除 (remove_file()) は IMAGE_DIR 内のロックファイルへの
+    flock で全ワーカー間で直列化し、DBの読み直しもロック内で行います。これにより、
+    別ワーカーの古い評価で上書きすることや、削除された画像が置き換えによって復活することを防ぎます。
+    """
+
+    def __init__(self, image_dir: str, database_path: str,
+                 interval: float = RATING_WRITEBACK_INTERVAL):
+        self.image_dir = image_dir
+        self.database_path = database_path
+        self.interval = interval
+        self._pending: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @contextmanager
+    def _locked(self):
+        # flockは開いたファイルごとのロックのため、同じプロセス内のスレッド間でも排他になる
+        with open(os.path.join(self.image_dir, RATING_WRITEBACK_LOCK_FILE), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def schedule(self, image_path: str):
+        self._pending.add(image_path)
+
+    def discard(self, image_path: str):
+        self._pending.discard(image_path)
+
+    def remove_file(self, image_path: str) -> bool:
+        """
+        書き戻しと競合しないように画像ファイルを削除します。ファイルが存在しなかった場合はFalseを返します。
+        スレッドから呼び出してください。
+        """
+        self.discard(image_path)
+        full_path = os.path.join(self.image_dir, image_path)
+        with self._locked():
+            if not os.path.exists(full_path):
+                return False
+            os.remove(full_path)
+            return True
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, set()
+        await asyncio.to_thread(self._write_all, pending)
+
+    def _read_ratings(self, image_paths: Set[str]):
+        with sqlite3.connect(self.database_path) as db:
+            rows = db.execute(
+                "SELECT image_path, rating FROM images WHERE image_path IN (SELECT value FROM json_each(?))",
+                (json.dumps(sorted(image_paths)),)
+            ).fetchall()
+        return dict(rows)
+
+    def _write_all(self, pending: Set[str]):
+        written = 0
+        with self._locked():
+            # ロック内でDBの現在の評価を読むため、後から書き戻したワーカーが必ず最新の値を書く
+            try:
+                ratings = self._read_ratings(pending)
+            except sqlite3.Error as e:
+                print(f"Error reading ratings for write-back: {e}")
+                return
+            for image_path, rating in ratings.items():
+                full_path = os.path.join(self.image_dir, image_path)
+                # DBから削除済み (行が無い) か、ファイルが削除された画像は書き込まない
+                if rating is None or not os.path.exists(full_path):
+                    continue
+                try:
+                    if write_rating_chunk(full_path, rating):
+                        written += 1
+                except (OSError, ValueError) as e:
+                    print(f"Error writing rating back to {full_path}: {e}")
+        print(f"Wrote ratings back to {written} PNG files.")
@@ -0,0 +1,208 @@
+import asyncio
+from typing import List, Optional
+
+import aiosqlite
+from pydantic import BaseModel
+
+from backfill import BACKFILL_IDLE_INTERVAL, BACKFILL_THROTTLE
+from db_writer import DBWriter
+from parameters_parser import ascii_lower, parse_model_name, split_search_terms
+
+# アルバム作成時に既存画像を評価する際の1回の読み込み件数
+ALBUM_POPULATE_BATCH_SIZE = 1000
+
+
+# スマートアルバム作成用のPydanticモデル
+class AlbumCreate(BaseModel):
+    name: str
+    query: Optional[str] = None # スペース区切りのAND検索語 (/api/images と同じく文字どおりに部分一致)
+    model: Optional[str] = None # モデル名
+    min_rating: int = 0 # 最低評価
+    max_age_days: Optional[int] = None # 直近何日以内に作成された画像か (表示時に適用)
+
+
+class AlbumPredicate:
+    """
+    アルバムの条件。画像1件分の値だけを見て所属するかどうかを判定します。
+
+    検索語は /api/images の query と同じ規則 (ASCIIのみ大文字小文字を区別せず、% や _ も文字どおり) で
+    部分一致させます。作成日時による絞り込み (max_age_days) は時間とともに変わるため所属表には含めず、
+    アルバムを開くときにSQLで適用します。
+    """
+
+    def __init__(self, album_id: int, query: Optional[str], model: Optional[str], min_rating: int):
+        self.album_id = album_id
+        self.terms = split_search_terms(query) if query else []
+        self.model = model
+        self.min_rating = min_rating or 0
+
+    def matches(self, search_text: Optional[str], model: Optional[str], rating: Optional[int]) -> bool:
+        if (rating or 0) < self.min_rating:
+            return False
+        if self.model and model != self.model:
+            return False
+        text = ascii_lower(search_text)
+        return all(term in text for term in self.terms)
+
+
+def _resolve_model(model: Optional[str], parameters: Optional[str]) -> str:
+    # バックフィル未処理の行はparametersからその場で抽出する
+    if model is not None:
+        return model
+    return parse_model_name(parameters)
+
+
+async def load_predicates(db: aiosqlite.Connection, album_id: Optional[int] = None) -> List[AlbumPredicate]:
+    sql = "SELECT id, query, model, min_rating FROM albums"
+    params = ()
+    if album_id is not None:
+        sql += " WHERE id = ?"
+        params = (album_id,)
+    cursor = await db.execute(sql, params)
+    return [AlbumPredicate(*row) for row in await cursor.fetchall()]
+
+
+async def add_image_memberships(db: aiosqlite.Connection, image_id: int, search_text: str,
+                                model: Optional[str], parameters: str, rating: int,
+                                predicates: List[AlbumPredicate]):
+    """
+    新しく挿入された画像を全アルバムの条件で評価し、所属表に追加します。
+    """
+    model = _resolve_model(model, parameters)
+    rows = [(p.album_id, image_id) for p in predicates if p.matches(search_text, model, rating)]
+    if rows:
+        await db.executemany("INSERT OR IGNORE INTO album_images (album_id, image_id) VALUES (?, ?)", rows)
+
+
+async def refresh_image_memberships(db: aiosqlite.Connection, image_id: int):
+    """
+    変更された画像を全アルバムの条件で評価し直し、所属表を更新します。
+    """
+    cursor = await db.execute(
+        "SELECT search_text, model, parameters, rating FROM images WHERE id = ?", (image_id,)
+    )
+    row = await cursor.fetchone()
+    if row is None:
+        await remove_image_memberships(db, image_id)
+        return
+    search_text, model, parameters, rating = row
+    model = _resolve_model(model, parameters)
+    predicates = await load_predicates(db)
+    for p in predicates:
+        if p.matches(search_text, model, rating):
+            await db.execute(
+                "INSERT OR IGNORE INTO album_images (album_id, image_id) VALUES (?, ?)",
+                (p.album_id, image_id)
+            )
+        else:
+            await db.execute(
+                "DELETE FROM album_images WHERE album_id = ? AND image_id = ?",
+                (p.album_id, image_id)
+            )
+
+
+async def remove_image_memberships(db: aiosqlite.Connection, image_id: int):
+    await db.execute("DELETE FROM album_images WHERE image_id = ?", (image_id,))
+
+
+class AlbumPopulator:
+    """
+    作成直後のアルバムについて、作成時点までの既存画像をid順のバッチで評価するバックグラウンドタスク。
+
+    BackfillRunner と同じく1バッチを1回の書き込み操作とし、バッチ間で書き込みロックを譲ります。
+    進捗 (populated_last_id) はバッチと同じトランザクションで albums に保存されるため、
+    再起動しても途中から再開でき、複数のワーカーが動いていても同じ範囲を二重に処理しません。
+    作成後に追加・変更された画像は同期や評価更新の中で評価されるため、ここでは扱いません。
+    """
+
+    def __init__(self, database_path: str, writer: DBWriter,
+                 batch_size: int = ALBUM_POPULATE_BATCH_SIZE,
+                 throttle: float = BACKFILL_THROTTLE):
+        self.database_path = database_path
+        self.writer = writer
+        self.batch_size = batch_size
+        self.throttle = throttle
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        """新しいアルバムが作成されたことを通知し、待機中のタスクをすぐに起こします。"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                async with aiosqlite.connect(self.database_path) as db:
+                    cursor = await db.execute("SELECT id FROM albums WHERE populating = 1 ORDER BY id")
+                    album_ids = [row[0] for row in await cursor.fetchall()]
+            except Exception as e:
+                print(f"Failed to load albums to populate: {e}")
+                album_ids = []
+
+            for album_id in album_ids:
+                try:
+                    await self.writer.submit(self._populate_batch(album_id))
+                except Exception as e:
+                    print(f"Populating album {album_id} failed: {e}")
+                await asyncio.sleep(self.throttle)
+
+            if not album_ids:
+                # 他のワーカーで作成されたアルバムも拾えるよう、通知が無くても定期的に確認する
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), BACKFILL_IDLE_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _populate_batch(self, album_id: int):
+        batch_size = self.batch_size
+
+        async def op(db: aiosqlite.Connection):
+            # 画像の読み込みと評価を書き込みトランザクション内で行い、評価更新などと競合しないようにする
+            cursor = await db.execute(
+                "SELECT populated_last_id, populate_max_id FROM albums WHERE id = ? AND populating = 1",
+                (album_id,)
+            )
+            progress = await cursor.fetchone()
+            if progress is None: # 削除済み、または他のワーカーが完了済み
+                return
+            last_id, max_id = progress
+            predicate = (await load_predicates(db, album_id))[0]
+            cursor = await db.execute(
+                """
+                SELECT id, search_text, model, parameters, rating
+                FROM images WHERE id > ? AND id <= ? ORDER BY id LIMIT ?
+                """,
+                (last_id, max_id, batch_size)
+            )
+            rows = await cursor.fetchall()
+            members = [
+                (album_id, image_id)
+                for image_id, search_text, model, parameters, rating in rows
+                if predicate.matches(search_text, _resolve_model(model, parameters), rating)
+            ]
+            if members:
+                await db.executemany("INSERT OR IGNORE INTO album_images (album_id, image_id) VALUES (?, ?)", members)
+
+            next_id = rows[-1][0] if rows else max_id
+            populating = 0 if len(rows) < batch_size or next_id >= max_id else 1
+            await db.execute(
+                "UPDATE albums SET populated_last_id = ?, populating = ? WHERE id = ?",
+                (next_id, populating, album_id)
+            )
+            if not populating:
+                print(f"Album {album_id} populated.")
+
+        return op